@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#------------------------------------------------------------------------------
+# file: $Id$
+# auth: metagriffin <mg.github@uberdev.org>
+# date: 2026/10/19
+# copy: (C) Copyright 2013-EOT metagriffin -- see LICENSE.txt
+#------------------------------------------------------------------------------
+# This software is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#------------------------------------------------------------------------------
+
+'''
+Compares the per-record cost of calling `morph.pick` / `morph.omit`
+in a loop against the batch `morph.pick_many` / `morph.omit_many`
+entry points (with each of the built-in executors). Usage::
+
+  python bench/many.py [RECORDS]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import morph
+
+#------------------------------------------------------------------------------
+def timeit(label, func, count):
+  start = time.time()
+  func()
+  elapsed = time.time() - start
+  sys.stdout.write('%-32s %8.3fs  %8.2f us/record\n'
+                   % (label, elapsed, elapsed * 1e6 / count))
+
+#------------------------------------------------------------------------------
+def main(count=100000):
+  records = [
+    {'id': idx, 'name': 'record-%d' % (idx,), 'owner': {'uid': idx, 'gid': 7},
+     'tags': ['a', 'b'], 'x-debug': True, 'x-trace': 'abc'}
+    for idx in range(count)]
+  keys = ('id', 'name', 'owner.uid')
+  timeit('pick (loop)', lambda: [
+    morph.pick(rec, *keys, tree=True) for rec in records], count)
+  for executor in ('serial', 'thread', 'process'):
+    timeit('pick_many (%s)' % (executor,), lambda: list(morph.pick_many(
+      records, *keys, tree=True, executor=executor, chunksize=1024)), count)
+  timeit('omit (loop)', lambda: [
+    morph.omit(rec, prefix='x-') for rec in records], count)
+  for executor in ('serial', 'thread', 'process'):
+    timeit('omit_many (%s)' % (executor,), lambda: list(morph.omit_many(
+      records, prefix='x-', executor=executor, chunksize=1024)), count)
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
+
+#------------------------------------------------------------------------------
+# end of $Id$
+#------------------------------------------------------------------------------
@@ -19,9 +19,26 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #------------------------------------------------------------------------------
 
+import os
+import re
 import sys
+import bisect
+import json
+import mmap
 import shlex
+import codecs
+import struct
+import hashlib
+import binascii
+import functools
+import itertools
+import collections
 import types
+import weakref
+try:
+  from collections.abc import Mapping, MutableMapping
+except ImportError:
+  from collections import Mapping, MutableMapping
 
 #------------------------------------------------------------------------------
 
@@ -36,10 +53,14 @@ if PY3:
   def isstr(obj):
     'Returns whether or not `obj` is a string-like object.'
     return isinstance(obj, str)
+  _strtypes = (str,)
+  _inttypes = (int,)
 else:
   def isstr(obj):
     'Returns whether or not `obj` is a string-like object.'
     return isinstance(obj, basestring)
+  _strtypes = (basestring,)
+  _inttypes = (int, long)
 
 #------------------------------------------------------------------------------
 def isseq(obj):
@@ -90,6 +111,16 @@ def isscalar(obj):
     or isinstance(obj, ( bool, int, float, bytes )) \
     or isstr(obj)
 
+#------------------------------------------------------------------------------
+if PY3:
+  _scalartypes = frozenset((type(None), bool, int, float, bytes, str))
+else:
+  _scalartypes = frozenset((type(None), bool, int, float, str, unicode))
+_missing     = object()
+# note: mapping proxies are deliberately excluded, since they are live
+#       views of a dict that can still change.
+_frozentypes = frozenset((tuple, frozenset))
+
 #------------------------------------------------------------------------------
 def isstruct(obj, primitives=False):
   '''
@@ -102,34 +133,123 @@ def isstruct(obj, primitives=False):
 
   * Added in version 0.1.5.
   '''
-  if isdict(obj):
-    if primitives:
-      for key, val in obj.items():
-        if not ( isprimitive(key) and isprimitive(val) ):
-          return False
-    return True
-  if isseq(obj):
-    if primitives:
-      for seg in obj:
-        if not isprimitive(seg):
-          return False
-    return True
+  if isdict(obj) or isseq(obj):
+    return not primitives or _nonprimitive(obj) is None
   return False
 
 #------------------------------------------------------------------------------
-def isprimitive(obj, recursive=True):
+def isprimitive(obj, recursive=True, cache=None):
   '''
   Returns ``True`` if `obj` is a primitive scalar (see `isscalar`)
   or recursive primitive structure (see `isstruct`). Otherwise
   returns ``False``.
 
+  If `cache` is specified, it must be a dict that is used to remember
+  the verdicts for immutable sub-structures (i.e. tuples and
+  frozensets that only contain scalars or other immutable
+  sub-structures), so that they are not re-inspected when the same
+  object is encountered again (see :func:`checkprimitive`).
+
   :ChangeLog:
 
   * Added in version 0.1.5.
+  * `cache` support added in version 0.1.6.
   '''
-  if isscalar(obj):
-    return True
-  return isstruct(obj, primitives=True)
+  return _nonprimitive(obj, cache) is None
+
+#------------------------------------------------------------------------------
+def checkprimitive(obj, cache=None):
+  '''
+  Identical to :func:`isprimitive`, but instead of returning a bool,
+  raises a ValueError that identifies the first non-primitive item
+  found in `obj` by its flattened key (see :func:`flatten`), or
+  returns `obj` if it is primitive. For example:
+
+  .. code:: python
+
+    morph.checkprimitive({'a': [1, object()]})
+    # ==> ValueError: non-primitive value at "a[1]": <object object at ...>
+
+  The structure is inspected iteratively (so deep structures do not
+  hit the recursion limit), the inspection stops at the first
+  non-primitive item, and cyclic structures are reported as
+  non-primitive. The optional `cache` dict is used to remember
+  positive verdicts for immutable sub-structures; note that the
+  cache holds references to the cached objects.
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  fail = _nonprimitive(obj, cache)
+  if fail is None:
+    return obj
+  path, value, iskey = fail
+  if iskey:
+    raise ValueError('non-primitive key in "%s": %r' % (path, value))
+  raise ValueError('non-primitive value at "%s": %r' % (path, value))
+def _nonprimitive(obj, cache=None):
+  # returns ``None`` if `obj` is primitive, otherwise a tuple of
+  # ``(path, value, iskey)`` of the first offending item. each frame
+  # is ``[items, container, segment, frozen, isdict]``.
+  if type(obj) in _scalartypes:
+    return None
+  frames = []
+  active = set()
+  node   = obj
+  seg    = None
+  while True:
+    typ = type(node)
+    if typ in _scalartypes \
+        or ( cache is not None and cache.get(id(node)) is node ):
+      pass
+    else:
+      if typ is dict:
+        items, isdct = iter(node.items()), True
+      elif typ is list or typ is tuple:
+        items, isdct = enumerate(node), False
+      elif isscalar(node):
+        items, isdct = None, None
+      elif isdict(node):
+        items, isdct = iter(node.items()), True
+      elif isseq(node):
+        items, isdct = enumerate(node), False
+      else:
+        return _primitivepath(frames, seg), node, False
+      if items is not None:
+        if id(node) in active:
+          return _primitivepath(frames, seg), node, False
+        active.add(id(node))
+        frames.append([items, node, seg, typ in _frozentypes, isdct])
+    node = _missing
+    while frames:
+      frame = frames[-1]
+      try:
+        seg, node = next(frame[0])
+      except StopIteration:
+        frames.pop()
+        active.discard(id(frame[1]))
+        if not frame[3]:
+          if frames:
+            frames[-1][3] = False
+        elif cache is not None:
+          cache[id(frame[1])] = frame[1]
+        continue
+      if frame[4] and type(seg) not in _scalartypes \
+          and _nonprimitive(seg, cache) is not None:
+        return _primitivepath(frames[:-1], frame[2]), seg, True
+      break
+    if node is _missing:
+      return None
+def _primitivepath(frames, seg):
+  ret = ''
+  for idx, frame in enumerate(frames):
+    sub = frames[idx + 1][2] if idx + 1 < len(frames) else seg
+    if frame[4]:
+      ret += ( '.' if idx else '' ) + str(sub)
+    else:
+      ret += '[' + str(sub) + ']'
+  return ret
 
 #------------------------------------------------------------------------------
 def tobool(obj, default=False):
@@ -207,6 +327,253 @@ def _relflatten(obj):
     return
   yield '', obj
 
+#------------------------------------------------------------------------------
+def iterflatten_json(source, lines=False, chunksize=65536):
+  '''
+  Generates the same ``(key, value)`` pairs as ``flatten(json.load(...))``
+  directly from the JSON text in `source`, without building the nested
+  structure in memory, i.e. memory usage is bounded by the nesting
+  depth (and longest single value) of the document rather than its
+  size. `source` can be a file-like object (opened in binary or text
+  mode), a bytes-like object (including a ``mmap.mmap``), or a
+  string. The document must be a JSON object. Note that, unlike
+  ``json.load``, duplicate keys are not collapsed.
+
+  If `lines` is truthy, `source` is parsed as newline-delimited JSON
+  (NDJSON) instead, i.e. a sequence of JSON objects, and a flattened
+  dict is generated for each object (so memory usage is bounded by
+  the largest record). For example:
+
+  .. code:: python
+
+    with open('data.ndjson', 'rb') as fp:
+      for record in morph.iterflatten_json(fp, lines=True):
+        ...
+
+  `chunksize` specifies how many bytes (or characters) are read or
+  decoded from `source` at a time.
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  events = _JSONEvents(_jsonchunks(source, chunksize)).events()
+  if not lines:
+    for item in _flatevents(events):
+      if item is None:
+        if next(events, None) is not None:
+          raise ValueError('unexpected JSON data after top-level object')
+        return
+      yield item
+    raise ValueError('unexpected end of JSON input')
+  record = dict()
+  for item in _flatevents(events):
+    if item is None:
+      yield record
+      record = dict()
+    else:
+      record[item[0]] = item[1]
+def _jsonchunks(source, chunksize):
+  if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)) \
+      and not isstr(source):
+    view = memoryview(source)
+    try:
+      decoder = codecs.getincrementaldecoder('utf-8-sig')()
+      for idx in range(0, len(view), chunksize):
+        yield decoder.decode(view[idx:idx + chunksize].tobytes())
+      yield decoder.decode(b'', True)
+    finally:
+      if hasattr(view, 'release'):
+        view.release()
+    return
+  if isstr(source):
+    for idx in range(0, len(source), chunksize):
+      yield source[idx:idx + chunksize]
+    return
+  decoder = None
+  while True:
+    chunk = source.read(chunksize)
+    if not chunk:
+      break
+    if not isstr(chunk):
+      if decoder is None:
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+      chunk = decoder.decode(chunk)
+    yield chunk
+  if decoder is not None:
+    yield decoder.decode(b'', True)
+def _flatevents(events):
+  # converts parser events to flattened ``(key, value)`` tuples, with
+  # ``None`` generated at the end of each top-level object. each frame
+  # is ``[path, islist, index-or-key]``.
+  frames = []
+  for event, value in events:
+    if not frames:
+      if event != 'start_map':
+        raise ValueError(
+          'only JSON objects can be flattened, not %s' % (
+            'an array' if event == 'start_array' else repr(value),))
+      frames.append(['', False, None])
+      continue
+    frame = frames[-1]
+    if event == 'key':
+      frame[2] = frame[0] + '.' + value if len(frames) > 1 else value
+      continue
+    if event == 'end_map' or event == 'end_array':
+      frames.pop()
+      if not frames:
+        yield None
+      continue
+    if frame[1]:
+      path = frame[0] + '[' + str(frame[2]) + ']'
+      frame[2] += 1
+    else:
+      path = frame[2]
+    if event == 'value':
+      yield path, value
+    elif event == 'start_map':
+      frames.append([path, False, None])
+    else:
+      frames.append([path, True, 0])
+
+#------------------------------------------------------------------------------
+class _JSONEvents(object):
+  '''
+  An incremental JSON parser that converts a stream of text chunks
+  into a stream of ``(event, value)`` tuples, where `event` is one of
+  ``start_map``, ``end_map``, ``start_array``, ``end_array``, ``key``
+  or ``value``. Any number of whitespace-separated top-level values are
+  accepted. Strings are decoded with the standard `json` module's
+  string scanner.
+  '''
+
+  wsre  = re.compile(r'[ \t\n\r]*')
+  tokre = re.compile(r'[-+.eE0-9]*')
+  numre = re.compile(r'-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?')
+  lits  = {'t': ('true', True), 'f': ('false', False), 'n': ('null', None)}
+
+  VALUE, KEY, COLON, NEXT, FIRSTVALUE, FIRSTKEY = range(6)
+
+  def __init__(self, chunks):
+    self.chunks = iter(chunks)
+    self.buf    = ''
+    self.pos    = 0
+    self.offset = 0
+    self.eof    = False
+
+  def fill(self):
+    for chunk in self.chunks:
+      if chunk:
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    self.eof = True
+    return False
+
+  def error(self, msg):
+    return ValueError('%s at offset %d' % (msg, self.offset + self.pos))
+
+  def events(self):
+    stack = []
+    state = self.VALUE
+    while True:
+      self.pos = self.wsre.match(self.buf, self.pos).end()
+      if self.pos >= len(self.buf):
+        if self.fill():
+          continue
+        if stack:
+          raise self.error('unexpected end of JSON input')
+        return
+      char = self.buf[self.pos]
+      if state == self.COLON:
+        if char != ':':
+          raise self.error('expected ":"')
+        self.pos += 1
+        state = self.VALUE
+        continue
+      if state == self.NEXT or state == self.FIRSTVALUE or state == self.FIRSTKEY:
+        if char in ']}':
+          if state == self.FIRSTVALUE and char != ']' \
+              or state == self.FIRSTKEY and char != '}' \
+              or state == self.NEXT and char != ( ']' if stack[-1] else '}' ):
+            raise self.error('unexpected "%s"' % (char,))
+          self.pos += 1
+          stack.pop()
+          yield ( 'end_array' if char == ']' else 'end_map' ), None
+          state = self.NEXT if stack else self.VALUE
+          continue
+        if state == self.NEXT:
+          if char != ',':
+            raise self.error('expected "," or "%s"' % ( ']' if stack[-1] else '}' ,))
+          self.pos += 1
+          state = self.VALUE if stack[-1] else self.KEY
+          continue
+        state = self.VALUE if state == self.FIRSTVALUE else self.KEY
+      if state == self.KEY:
+        if char != '"':
+          raise self.error('expected object key')
+        value = self.string()
+        if value is _missing:
+          continue
+        yield 'key', value
+        state = self.COLON
+        continue
+      # state == self.VALUE
+      if char == '{':
+        self.pos += 1
+        stack.append(False)
+        yield 'start_map', None
+        state = self.FIRSTKEY
+        continue
+      if char == '[':
+        self.pos += 1
+        stack.append(True)
+        yield 'start_array', None
+        state = self.FIRSTVALUE
+        continue
+      if char == '"':
+        value = self.string()
+      elif char in self.lits:
+        value = self.literal(char)
+      else:
+        value = self.number()
+      if value is _missing:
+        continue
+      yield 'value', value
+      state = self.NEXT if stack else self.VALUE
+
+  def string(self):
+    try:
+      value, end = json.decoder.scanstring(self.buf, self.pos + 1)
+    except ValueError:
+      if not self.eof and self.fill():
+        return _missing
+      raise self.error('invalid JSON string')
+    self.pos = end
+    return value
+
+  def literal(self, char):
+    text, value = self.lits[char]
+    if len(self.buf) - self.pos < len(text) and not self.eof and self.fill():
+      return _missing
+    if not self.buf.startswith(text, self.pos):
+      raise self.error('invalid JSON literal')
+    self.pos += len(text)
+    return value
+
+  def number(self):
+    end = self.tokre.match(self.buf, self.pos).end()
+    if end >= len(self.buf) and not self.eof and self.fill():
+      return _missing
+    match = self.numre.match(self.buf, self.pos, end)
+    if end == self.pos or not match or match.end() != end:
+      raise self.error('invalid JSON value')
+    self.pos = end
+    if match.group(1) or match.group(2):
+      return float(match.group(0))
+    return int(match.group(0))
+
 #------------------------------------------------------------------------------
 def unflatten(obj):
   '''
@@ -270,11 +637,803 @@ def _relunflatten(pfx, values):
   return [_relunflatten(pfx + '[' + str(pos) + ']', tmp[pos])
           for pos in sorted(tmp.keys())]
 
+#------------------------------------------------------------------------------
+def _nextsep(key, start):
+  dot = key.find('.', start)
+  brk = key.find('[', start)
+  if dot < 0:
+    return len(key) if brk < 0 else brk
+  return dot if brk < 0 else min(dot, brk)
+def _parsekey(key):
+  '''
+  Splits the flattened `key` into a list of ``(segment, end)`` tuples,
+  where `segment` is either a dict key (string) or a list index
+  (integer), and ``key[:end]`` is the flattened prefix that addresses
+  that segment.
+  '''
+  idx  = _nextsep(key, 0)
+  ret  = [(key[:idx], idx)]
+  size = len(key)
+  while idx < size:
+    if key[idx] == '.':
+      nxt = _nextsep(key, idx + 1)
+      ret.append((key[idx + 1:nxt], nxt))
+      idx = nxt
+      continue
+    nxt = key.find(']', idx)
+    if nxt < 0:
+      raise ValueError(
+        'invalid list syntax (no terminating "]") in key "%s"' % (key,))
+    try:
+      pos = int(key[idx + 1:nxt])
+    except ValueError:
+      pos = -1
+    if pos < 0:
+      raise ValueError(
+        'invalid list syntax (bad index) in key "%s"' % (key,))
+    idx = nxt + 1
+    ret.append((pos, idx))
+    if idx < size and key[idx] not in '.[':
+      raise ValueError(
+        'invalid list syntax (unexpected "%s" after "]") in key "%s"'
+        % (key[idx], key))
+  return ret
+
+#------------------------------------------------------------------------------
+def _getchild(cur, seg):
+  if isinstance(seg, int):
+    return cur[seg] if seg < len(cur) else _missing
+  return cur[seg] if seg in cur else _missing
+def _setchild(cur, seg, value, undo):
+  # `undo` is a list that receives the callables that revert the change
+  if isinstance(seg, int):
+    if seg < len(cur):
+      undo.append(functools.partial(cur.__setitem__, seg, cur[seg]))
+      cur[seg] = value
+      return
+    undo.append(functools.partial(cur.__delitem__, slice(len(cur), None)))
+    cur.extend([None] * (seg - len(cur)))
+    cur.append(value)
+    return
+  if seg in cur:
+    undo.append(functools.partial(cur.__setitem__, seg, cur[seg]))
+  else:
+    undo.append(functools.partial(cur.__delitem__, seg))
+  cur[seg] = value
+def _intochild(cur, seg, kind, pfx, undo):
+  child = _getchild(cur, seg)
+  if child is _missing or child is None:
+    child = kind()
+    _setchild(cur, seg, child, undo)
+    return child
+  if isdict(child):
+    if kind is dict:
+      return child
+    raise ValueError(
+      'conflicting structures (dict vs. list) for prefix: %s' % (pfx,))
+  if isseq(child):
+    if kind is dict:
+      raise ValueError(
+        'conflicting structures (dict vs. list) for prefix: %s' % (pfx,))
+    if not isinstance(child, list):
+      child = list(child)
+      _setchild(cur, seg, child, undo)
+    return child
+  raise ValueError(
+    'conflicting scalar vs. structure for prefix: %s' % (pfx,))
+
+#------------------------------------------------------------------------------
+def unflatten_into(target, obj, delete=None):
+  '''
+  Applies the flattened dict-like `obj` to the existing nested
+  dict-like `target` *in place* and returns `target`. Only the
+  paths addressed by the keys in `obj` are walked: missing dicts are
+  created, lists are extended (with ``None`` used to fill any gaps)
+  and the addressed values are replaced. Note that, unlike
+  :func:`unflatten`, list indices are applied as-is and are not
+  compacted.
+
+  If `delete` is specified, it must be an iterable of flattened keys
+  that will be removed from `target` before `obj` is applied (keys
+  that do not exist are silently ignored). Deletions are applied in
+  descending order, so deleting several items of the same list
+  behaves as expected, and list indices in `obj` refer to the
+  structure *after* the deletions.
+
+  The same conflict errors as :func:`unflatten` are raised, both for
+  conflicts within `obj` itself and for conflicts with the existing
+  structure of `target`, in which case `target` is left unchanged.
+  For example:
+
+  .. code:: python
+
+    cfg = {'services': [{'port': 80}, {'port': 443}]}
+    morph.unflatten_into(cfg, {'services[1].port': 8443, 'debug': True})
+    # ==> {'services': [{'port': 80}, {'port': 8443}], 'debug': True}
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  if not isdict(target):
+    raise ValueError(
+      'only dict-like objects can be unflattened into, not %r' % (target,))
+  if not isdict(obj):
+    raise ValueError(
+      'only dict-like objects can be unflattened, not %r' % (obj,))
+  # parse all keys and check `obj` for internal conflicts before
+  # touching `target`...
+  updates = [(key, _parsekey(key), value) for key, value in obj.items()]
+  leaves  = set()
+  structs = dict()
+  for key, path, value in updates:
+    for idx in range(len(path) - 1):
+      end  = path[idx][1]
+      kind = list if isinstance(path[idx + 1][0], int) else dict
+      spec = tuple(item[0] for item in path[:idx + 1])
+      if spec in leaves:
+        raise ValueError(
+          'conflicting scalar vs. structure for prefix: %s' % (key[:end],))
+      if structs.setdefault(spec, kind) is not kind:
+        raise ValueError(
+          'conflicting structures (dict vs. list) for prefix: %s'
+          % (key[:end],))
+    spec = tuple(item[0] for item in path)
+    if spec in structs:
+      raise ValueError(
+        'conflicting scalar vs. structure for prefix: %s' % (key,))
+    leaves.add(spec)
+  paths = [[seg for seg, end in _parsekey(key)] for key in delete or ()]
+  paths.sort(key=lambda path: [(isinstance(seg, int), seg) for seg in path],
+             reverse=True)
+  # ...then apply the changes, reverting them all if `target` has a
+  # conflicting structure (which, due to the deletions, can only be
+  # determined while applying them).
+  undo = []
+  try:
+    for path in paths:
+      _delpath(target, path, undo)
+    for key, path, value in updates:
+      cur = target
+      for idx in range(len(path) - 1):
+        seg, end = path[idx]
+        kind = list if isinstance(path[idx + 1][0], int) else dict
+        cur = _intochild(cur, seg, kind, key[:end], undo)
+      _setchild(cur, path[-1][0], value, undo)
+  except Exception:
+    for revert in reversed(undo):
+      revert()
+    raise
+  return target
+def _delpath(target, path, undo):
+  cur = target
+  for seg in path[:-1]:
+    child = _getchild(cur, seg) if isinstance(seg, int) == isseq(cur) else _missing
+    if child is _missing or not ( isdict(child) or isseq(child) ):
+      return
+    if isseq(child) and not isinstance(child, list):
+      child = list(child)
+      _setchild(cur, seg, child, undo)
+    cur = child
+  seg = path[-1]
+  if isinstance(seg, int):
+    if isseq(cur) and seg < len(cur):
+      undo.append(functools.partial(cur.insert, seg, cur[seg]))
+      del cur[seg]
+  elif isdict(cur) and seg in cur:
+    undo.append(functools.partial(cur.__setitem__, seg, cur[seg]))
+    del cur[seg]
+
+#------------------------------------------------------------------------------
+def iterunflatten(pairs, record_key=None):
+  '''
+  Generates ``(prefix, value)`` tuples by unflattening a stream of
+  flattened ``(key, value)`` `pairs` (or a dict-like object) one
+  record at a time, where each record is the set of consecutive pairs
+  that share the same record prefix, `prefix` is that prefix and
+  `value` is the unflattened record (i.e. the same value that
+  ``unflatten(...)[prefix]`` would contain). Each record is generated
+  as soon as a pair with a different prefix (or the end of `pairs`) is
+  encountered, so memory usage is bounded by the largest record
+  rather than the entire stream.
+
+  By default, the record prefix is the top-level key (i.e. everything
+  up to the first ``"."`` or ``"["``). If `record_key` is specified,
+  it must be a callable that returns the record prefix for a given
+  flattened key, e.g. to split a single top-level list into records:
+
+  .. code:: python
+
+    rows = [('users[0].name', 'alice'), ('users[0].uid', 1),
+            ('users[1].name', 'bob'), ('users[1].uid', 2)]
+    pfx  = lambda key: key[:key.index(']') + 1]
+    list(morph.iterunflatten(rows, record_key=pfx))
+    # ==> [('users[0]', {'name': 'alice', 'uid': 1}),
+    #      ('users[1]', {'name': 'bob', 'uid': 2})]
+
+  Note that the pairs of a record MUST be consecutive: if a prefix
+  re-appears after its record was generated, a ValueError is raised.
+  Sorting the stream by record prefix (e.g. ``ORDER BY prefix``) is
+  sufficient; note that sorting by the full key is not, since
+  ``"a.x" < "a0" < "a[0]"``. If `pairs` is a dict-like object, its
+  items are sorted by record prefix first.
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  if record_key is None:
+    record_key = lambda key: key[:_nextsep(key, 0)]
+  if isdict(pairs):
+    pairs = sorted(pairs.items(), key=lambda item: record_key(item[0]))
+  prefix = _missing
+  values = None
+  seen   = set()
+  for key, value in pairs:
+    pfx = record_key(key)
+    if pfx != prefix:
+      if pfx in seen:
+        raise ValueError(
+          'record prefix "%s" re-appears in non-consecutive pairs (key "%s")'
+          % (pfx, key))
+      if prefix is not _missing:
+        yield prefix, _unflattenrecord(prefix, values)
+      prefix = pfx
+      values = dict()
+      seen.add(pfx)
+    rel = key[len(pfx):]
+    if not key.startswith(pfx) or rel[:1] not in ('', '.', '['):
+      raise ValueError(
+        'record prefix "%s" does not address key "%s"' % (pfx, key))
+    values[rel] = value
+  if prefix is not _missing:
+    yield prefix, _unflattenrecord(prefix, values)
+def _unflattenrecord(prefix, values):
+  if '' in values and len(values) > 1:
+    raise ValueError(
+      'conflicting scalar vs. structure for prefix: %s' % (prefix,))
+  return _relunflatten(prefix, values)
+
+#------------------------------------------------------------------------------
+def digest(obj, algo='sha256', memo=None):
+  '''
+  Returns a canonical structural hash of `obj` as a hexadecimal
+  string, computed with the `hashlib` algorithm `algo`. The hash only
+  depends on the dict/sequence/scalar model that `isdict`, `isseq` and
+  `isscalar` define, i.e.:
+
+  * dict-like objects hash identically regardless of item order or
+    class (so ``OrderedDict`` and ``dict`` are equivalent);
+  * sequence-like objects hash identically regardless of class (so
+    tuples and lists are equivalent), and sets are hashed in a
+    canonical order;
+  * scalars are hashed with their type, so ``1``, ``1.0``, ``True``
+    and ``"1"`` all differ;
+  * empty dicts and sequences do not contribute to the hash of their
+    container, since they are dropped by :func:`flatten`.
+
+  No intermediate flattened or serialized form is built: each subtree
+  is hashed once and combined with its siblings. As a consequence,
+  ``digest(obj) == digest_flat(flatten(obj))`` holds for any dict
+  `obj` that can be round-tripped through `flatten` and `unflatten`.
+
+  If `memo` is specified, it must be a dict that is used to remember
+  the hashes of immutable subtrees (i.e. tuples and frozensets that
+  only contain scalars or other immutable subtrees), keyed on their
+  identity, so that repeated sub-documents are only hashed once (even
+  across calls). The memo holds references
+  to the memoized objects and should only be shared between calls
+  that use the same `algo`.
+
+  A ValueError is raised if `obj` contains values that are not
+  primitives (see :func:`isprimitive`).
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  factory = _hashfactory(algo)
+  return binascii.hexlify(_digestnode(obj, factory, memo)).decode('ascii')
+
+#------------------------------------------------------------------------------
+def digest_flat(obj, algo='sha256'):
+  '''
+  Returns the same hash as :func:`digest` would return for the
+  unflattened version of the flattened dict-like `obj`, without
+  building the entire unflattened structure: top-level records are
+  unflattened and hashed one at a time (see :func:`iterunflatten`).
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  if not isdict(obj):
+    raise ValueError(
+      'only dict-like objects can be digested as flattened, not %r' % (obj,))
+  factory = _hashfactory(algo)
+  items   = sorted(obj.items(), key=lambda item: item[0][:_nextsep(item[0], 0)])
+  parts   = []
+  for key, value in iterunflatten(items):
+    sub = _digest(value, factory, None)[0]
+    if sub is not None:
+      parts.append(_digestscalar(key, factory) + sub)
+  parts.sort()
+  return factory(b'd' + b''.join(parts)).hexdigest()
+
+#------------------------------------------------------------------------------
+def _hashfactory(algo):
+  if algo in hashlib.algorithms_guaranteed:
+    return getattr(hashlib, algo)
+  return functools.partial(hashlib.new, algo)
+def _digestscalar(obj, factory):
+  if obj is None:
+    return factory(b'n').digest()
+  if isinstance(obj, bool):
+    return factory(b't' if obj else b'f').digest()
+  if isinstance(obj, int):
+    return factory(b'i' + str(int(obj)).encode('ascii')).digest()
+  if isinstance(obj, float):
+    return factory(b'r' + float(obj).hex().encode('ascii')).digest()
+  if isinstance(obj, bytes):
+    return factory(b'b' + bytes(obj)).digest()
+  return factory(b's' + obj.encode('utf-8')).digest()
+def _digestnode(obj, factory, memo):
+  # like `_digest`, but empty structures hash to a fixed digest instead
+  # of ``None`` (used for the root object and for dict keys, which are
+  # never dropped)
+  ret = _digest(obj, factory, memo)[0]
+  if ret is None:
+    ret = factory(b'd' if isdict(obj) else b'l').digest()
+  return ret
+def _digest(obj, factory, memo):
+  # returns a tuple of (digest, frozen), where digest is ``None`` for
+  # empty structures
+  if type(obj) in _scalartypes or isscalar(obj):
+    return _digestscalar(obj, factory), True
+  if memo is not None:
+    hit = memo.get(id(obj))
+    if hit is not None and hit[0] is obj:
+      return hit[1], True
+  frozen = type(obj) in _frozentypes
+  parts  = []
+  if isdict(obj):
+    tag = b'd'
+    for key, val in obj.items():
+      sub, subfrozen = _digest(val, factory, memo)
+      frozen = frozen and subfrozen
+      if sub is not None:
+        parts.append(_digestnode(key, factory, memo) + sub)
+    parts.sort()
+  elif isseq(obj):
+    tag = b'l'
+    for val in obj:
+      sub, subfrozen = _digest(val, factory, memo)
+      frozen = frozen and subfrozen
+      if sub is not None:
+        parts.append(sub)
+    if isinstance(obj, (set, frozenset)):
+      parts.sort()
+  else:
+    raise ValueError('cannot digest non-primitive value: %r' % (obj,))
+  ret = factory(tag + b''.join(parts)).digest() if parts else None
+  if frozen and memo is not None:
+    memo[id(obj)] = (obj, ret)
+  return ret, frozen
+
+#------------------------------------------------------------------------------
+class FlatStore(Mapping):
+  '''
+  A read-only, memory-mapped, on-disk mapping of flattened keys (see
+  :func:`flatten`) to JSON-serializable values. A store is written
+  once with :meth:`FlatStore.build` and then opened (typically by many
+  processes, which then share the same pages via the OS page cache)
+  with :meth:`FlatStore.open`, which costs next to nothing since no
+  data is read until it is accessed. For example:
+
+  .. code:: python
+
+    morph.FlatStore.build('catalog.mfs', catalog)
+    with morph.FlatStore.open('catalog.mfs') as store:
+      store['services[3].port']
+      dict(store.iterprefix('services[3].'))
+      store.unflatten('services[3]')
+
+  Keys are looked up by binary search over the sorted keys in O(log n).
+  The file layout is a header (magic and record count), followed by a
+  table of record offsets, followed by the records themselves, each
+  of which is the length of the UTF-8 encoded key, the key, and the
+  compact JSON encoding of the value.
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+
+  MAGIC  = b'MORPHFS1'
+  HEADER = struct.Struct('<8sQ')
+  OFFSET = struct.Struct('<Q')
+  KEYLEN = struct.Struct('<I')
+
+  #----------------------------------------------------------------------------
+  @classmethod
+  def build(cls, path, obj):
+    '''
+    Writes a new store to `path` (atomically replacing any existing
+    file) from `obj`, which can either be a dict-like object (which is
+    flattened first; note that flattening an already-flattened dict
+    has no effect) or an iterable of flattened ``(key, value)`` pairs.
+    Returns the number of keys written.
+    '''
+    items = flatten(obj).items() if isdict(obj) else obj
+    records = []
+    for key, value in items:
+      if not isstr(key):
+        raise ValueError('FlatStore keys must be strings, not %r' % (key,))
+      records.append((
+        key.encode('utf-8'),
+        json.dumps(value, separators=(',', ':')).encode('utf-8')))
+    records.sort(key=lambda record: record[0])
+    for idx in range(1, len(records)):
+      if records[idx - 1][0] == records[idx][0]:
+        raise ValueError(
+          'duplicate FlatStore key: %s' % (records[idx][0].decode('utf-8'),))
+    tmppath = path + '.tmp'
+    try:
+      with open(tmppath, 'wb') as fp:
+        fp.write(cls.HEADER.pack(cls.MAGIC, len(records)))
+        offset = cls.HEADER.size + cls.OFFSET.size * ( len(records) + 1 )
+        for key, value in records:
+          fp.write(cls.OFFSET.pack(offset))
+          offset += cls.KEYLEN.size + len(key) + len(value)
+        fp.write(cls.OFFSET.pack(offset))
+        for key, value in records:
+          fp.write(cls.KEYLEN.pack(len(key)))
+          fp.write(key)
+          fp.write(value)
+      if hasattr(os, 'replace'):
+        os.replace(tmppath, path)
+      else:
+        os.rename(tmppath, path)
+    except Exception:
+      if os.path.exists(tmppath):
+        os.remove(tmppath)
+      raise
+    return len(records)
+
+  #----------------------------------------------------------------------------
+  @classmethod
+  def open(cls, path):
+    '''
+    Opens the store at `path` (previously written by
+    :meth:`FlatStore.build`) as a read-only memory map.
+    '''
+    with open(path, 'rb') as fp:
+      buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      return cls(buf)
+    except Exception:
+      buf.close()
+      raise
+
+  #----------------------------------------------------------------------------
+  def __init__(self, buf):
+    if len(buf) < self.HEADER.size:
+      raise ValueError('not a morph FlatStore (truncated header)')
+    magic, count = self.HEADER.unpack_from(buf, 0)
+    if magic != self.MAGIC:
+      raise ValueError('not a morph FlatStore (invalid magic %r)' % (magic,))
+    table = self.HEADER.size + self.OFFSET.size * ( count + 1 )
+    if table > len(buf) \
+        or self.OFFSET.unpack_from(buf, table - self.OFFSET.size)[0] > len(buf):
+      raise ValueError('corrupt morph FlatStore (truncated data)')
+    self.buf   = buf
+    self.count = count
+
+  def close(self):
+    if hasattr(self.buf, 'close'):
+      self.buf.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  #----------------------------------------------------------------------------
+  def _offset(self, idx):
+    return self.OFFSET.unpack_from(
+      self.buf, self.HEADER.size + self.OFFSET.size * idx)[0]
+
+  def _key(self, idx):
+    start = self._offset(idx)
+    size  = self.KEYLEN.unpack_from(self.buf, start)[0]
+    start += self.KEYLEN.size
+    return self.buf[start:start + size]
+
+  def _value(self, idx, keysize):
+    start = self._offset(idx) + self.KEYLEN.size + keysize
+    return json.loads(self.buf[start:self._offset(idx + 1)].decode('utf-8'))
+
+  def _bisect(self, key):
+    # returns the index of the first key that is >= `key` (bytes)
+    lo, hi = 0, self.count
+    while lo < hi:
+      mid = ( lo + hi ) // 2
+      if self._key(mid) < key:
+        lo = mid + 1
+      else:
+        hi = mid
+    return lo
+
+  def _find(self, key):
+    if not isstr(key):
+      return None, None
+    key = key.encode('utf-8')
+    idx = self._bisect(key)
+    if idx < self.count and self._key(idx) == key:
+      return idx, key
+    return None, None
+
+  #----------------------------------------------------------------------------
+  def __len__(self):
+    return self.count
+
+  def __iter__(self):
+    for idx in range(self.count):
+      yield self._key(idx).decode('utf-8')
+
+  def __contains__(self, key):
+    return self._find(key)[0] is not None
+
+  def __getitem__(self, key):
+    idx, bkey = self._find(key)
+    if idx is None:
+      raise KeyError(key)
+    return self._value(idx, len(bkey))
+
+  #----------------------------------------------------------------------------
+  def iterprefix(self, prefix, exclude=False):
+    '''
+    Generates the ``(key, value)`` pairs for all keys that start with
+    `prefix`, in sorted key order, by scanning only the matching key
+    range. Note that ``{k[len(prefix):]: v for k, v in
+    store.iterprefix(prefix)}`` is equivalent to ``morph.pick(store,
+    prefix=prefix)``, which uses this method. If `exclude` is truthy,
+    generates all the pairs whose keys do NOT start with `prefix`
+    instead (as used by :func:`omit`).
+    '''
+    bprefix = prefix.encode('utf-8')
+    lo = hi = self._bisect(bprefix)
+    while hi < self.count and self._key(hi).startswith(bprefix):
+      hi += 1
+    ranges = ((0, lo), (hi, self.count)) if exclude else ((lo, hi),)
+    for start, end in ranges:
+      for idx in range(start, end):
+        key = self._key(idx)
+        yield key.decode('utf-8'), self._value(idx, len(key))
+
+  #----------------------------------------------------------------------------
+  def unflatten(self, prefix=None):
+    '''
+    Returns the unflattened value of the subtree addressed by the
+    flattened key `prefix` (e.g. ``"services[3]"``), or of the entire
+    store if `prefix` is not specified, by only reading the keys in
+    that subtree. Raises a KeyError if no key is addressed by `prefix`.
+    '''
+    if not prefix:
+      return unflatten(dict(self.iterprefix('')))
+    values = dict()
+    for key, value in self.iterprefix(prefix):
+      rel = key[len(prefix):]
+      if rel[:1] in ('', '.', '['):
+        values[rel] = value
+    if not values:
+      raise KeyError(prefix)
+    return _unflattenrecord(prefix, values)
+
+#------------------------------------------------------------------------------
+class PrefixIndex(MutableMapping):
+  '''
+  A dict-like wrapper around `mapping` (which defaults to a new empty
+  dict) that maintains a sorted index of its string keys, so that
+  selecting all the keys with a given prefix takes O(log n + k) time
+  instead of a full scan. :func:`pick` and :func:`omit` accept a
+  PrefixIndex directly and use the index for their `prefix` selection,
+  with exactly the same results as for the wrapped `mapping`. For
+  example:
+
+  .. code:: python
+
+    index = morph.PrefixIndex(morph.flatten(catalog))
+    morph.pick(index, prefix='services[4].')
+
+  The index is updated incrementally when items are set or deleted
+  through the PrefixIndex; changes made directly to `mapping` are not
+  detected (call :meth:`reindex` after such changes).
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+
+  def __init__(self, mapping=None):
+    self.mapping = mapping if mapping is not None else dict()
+    self.reindex()
+
+  def reindex(self):
+    '''
+    Rebuilds the index from scratch from the wrapped mapping.
+    '''
+    self.index  = sorted(key for key in self.mapping if isstr(key))
+    self.others = set(key for key in self.mapping if not isstr(key))
+
+  #----------------------------------------------------------------------------
+  def __len__(self):
+    return len(self.mapping)
+
+  def __iter__(self):
+    return iter(self.mapping)
+
+  def __contains__(self, key):
+    return key in self.mapping
+
+  def __getitem__(self, key):
+    return self.mapping[key]
+
+  def __setitem__(self, key, value):
+    if key not in self.mapping:
+      if isstr(key):
+        bisect.insort(self.index, key)
+      else:
+        self.others.add(key)
+    self.mapping[key] = value
+
+  def __delitem__(self, key):
+    del self.mapping[key]
+    if not isstr(key):
+      self.others.discard(key)
+      return
+    idx = bisect.bisect_left(self.index, key)
+    if idx < len(self.index) and self.index[idx] == key:
+      del self.index[idx]
+
+  def __repr__(self):
+    return 'PrefixIndex(%r)' % (self.mapping,)
+
+  #----------------------------------------------------------------------------
+  def iterprefix(self, prefix, exclude=False):
+    '''
+    Generates the ``(key, value)`` pairs for all keys that start with
+    `prefix` in sorted key order, or, if `exclude` is truthy, for all
+    the keys that do not (including any non-string keys).
+    '''
+    lo = hi = bisect.bisect_left(self.index, prefix)
+    while hi < len(self.index) and self.index[hi].startswith(prefix):
+      hi += 1
+    ranges = ((0, lo), (hi, len(self.index))) if exclude else ((lo, hi),)
+    for start, end in ranges:
+      for idx in range(start, end):
+        key = self.index[idx]
+        yield key, self.mapping[key]
+    if exclude:
+      for key in self.others:
+        yield key, self.mapping[key]
+
 #------------------------------------------------------------------------------
 def properties(obj):
-  for attr in dir(obj):
-    if not attr.startswith('_') and not callable(getattr(obj, attr)):
-      yield attr
+  '''
+  Generates the names of the public (i.e. not starting with an
+  underscore), non-callable attributes of `obj`, in sorted order.
+
+  The class-level attributes of `obj` are only inspected once per
+  class, which means that changes made to a class's attributes after
+  it was first inspected are not detected. Attributes stored in the
+  instance ``__dict__`` are read directly and methods are never
+  fetched, so only properties and other descriptors are evaluated.
+
+  :ChangeLog:
+
+  * Per-class attribute caching added in version 0.1.6.
+  '''
+  for attr, value in _attrvalues(obj):
+    yield attr
+
+#------------------------------------------------------------------------------
+_ATTR_INSTANCE, _ATTR_METHOD, _ATTR_STATIC, _ATTR_DATA, _ATTR_DYNAMIC = range(5)
+_attrplans   = weakref.WeakKeyDictionary()
+_methodtypes = (types.FunctionType, classmethod, staticmethod, type(str.join))
+def _attrplan(cls):
+  '''
+  Returns a tuple of ``(kinds, names)`` that describes how to extract
+  the public attributes of instances of `cls`, where `kinds` maps each
+  public class-level attribute name to how it should be resolved and
+  `names` is the sorted list of those names. Returns ``None`` if
+  instances of `cls` customize attribute lookup or listing, in which
+  case the generic ``dir()`` approach must be used.
+  '''
+  try:
+    return _attrplans[cls]
+  except KeyError:
+    pass
+  except TypeError:
+    return None
+  plan = None
+  if getattr(cls, '__getattr__', None) is None \
+      and getattr(cls, '__getattribute__', None) is object.__getattribute__ \
+      and getattr(cls, '__dir__', None) is getattr(object, '__dir__', None):
+    kinds = dict()
+    for name in dir(cls):
+      if name.startswith('_'):
+        continue
+      for klass in cls.__mro__:
+        if name in vars(klass):
+          raw = vars(klass)[name]
+          break
+      else:
+        kinds[name] = _ATTR_DYNAMIC
+        continue
+      rtyp = type(raw)
+      if not hasattr(rtyp, '__get__'):
+        kinds[name] = _ATTR_METHOD if callable(raw) else _ATTR_STATIC
+      elif hasattr(rtyp, '__set__') or hasattr(rtyp, '__delete__'):
+        # data descriptors (properties, slots, namedtuple fields, etc)
+        # take precedence over the instance dict
+        kinds[name] = _ATTR_DATA
+      elif isinstance(raw, _methodtypes):
+        kinds[name] = _ATTR_METHOD
+      else:
+        kinds[name] = _ATTR_DYNAMIC
+    plan = (kinds, sorted(kinds.keys()))
+  try:
+    _attrplans[cls] = plan
+  except TypeError:
+    pass
+  return plan
+def _attrvalues(obj, match=None):
+  '''
+  Generates ``(name, value)`` tuples for each public, non-callable
+  attribute of `obj` (in sorted name order) using the per-class plan
+  returned by :func:`_attrplan`. If `match` is specified, it is
+  called with each attribute name *before* the attribute is fetched,
+  and the attribute is skipped if it returns falsy. Unlike
+  ``getattr()``, attribute values that are stored in the instance
+  ``__dict__`` are fetched directly, and attributes that can be
+  determined to be methods are never fetched. Attributes that raise an
+  AttributeError (e.g. unset slots) are skipped.
+  '''
+  plan = _attrplan(type(obj))
+  if plan is None:
+    for attr in dir(obj):
+      if attr.startswith('_') or ( match is not None and not match(attr) ):
+        continue
+      value = getattr(obj, attr)
+      if not callable(value):
+        yield attr, value
+    return
+  kinds, names = plan
+  try:
+    state = vars(obj)
+  except TypeError:
+    state = None
+  if state:
+    extra = [key for key in state
+             if key not in kinds and isstr(key) and not key.startswith('_')]
+    if extra:
+      names = sorted(names + extra)
+  for name in names:
+    if match is not None and not match(name):
+      continue
+    kind = kinds.get(name, _ATTR_INSTANCE)
+    if kind != _ATTR_DATA and state is not None and name in state:
+      value = state[name]
+    elif kind == _ATTR_METHOD:
+      continue
+    else:
+      value = getattr(obj, name, _missing)
+      if value is _missing:
+        continue
+    if not callable(value):
+      yield name, value
 
 #------------------------------------------------------------------------------
 def pick(source, *keys, **kws):
@@ -298,17 +1457,43 @@ def pick(source, *keys, **kws):
 
   Requests for keys not found in `source` are silently ignored.
 
+  If `source` is dict-like and has an ``iterprefix(prefix, exclude)``
+  method (e.g. a :class:`PrefixIndex` or :class:`FlatStore`), that
+  method is used to select the keys that match `prefix`.
+
   :ChangeLog:
 
   * `tree` support added in version 0.1.3.
+  * `iterprefix` support added in version 0.1.6.
   '''
+  return _pick(source, _pickspec('pick', keys, kws))
+def _pickspec(name, keys, kws):
+  # validates the `pick` or `omit` (as specified by `name`) keyword
+  # arguments and pre-computes the key sets, returning a tuple of
+  # ``(rettype, prefix, keys, rkeys, rkeyset, subspecs)``, where
+  # `subspecs` is a list of ``(key, spec)`` tuples for `tree` keys.
   rettype = kws.pop('dict', dict)
   prefix  = kws.pop('prefix', None)
   tree    = kws.pop('tree', False)
   if kws:
-    raise ValueError('invalid pick keyword arguments: %r' % (kws.keys(),))
+    raise ValueError('invalid %s keyword arguments: %r' % (name, kws.keys(),))
   if prefix is not None and tree:
     raise ValueError('`prefix` and `tree` currently cannot be used together')
+  rkeys    = keys
+  subspecs = []
+  if tree:
+    if name == 'pick':
+      rkeys = tuple(key.split('.', 1)[0] for key in keys)
+    else:
+      rkeys = tuple(key for key in keys if '.' not in key)
+    for key in keys:
+      if '.' in key:
+        key, rem = key.split('.', 1)
+        subspecs.append((key, _pickspec(
+          name, (rem,), dict(dict=rettype, prefix=prefix, tree=tree))))
+  return (rettype, prefix, keys, rkeys, frozenset(rkeys), subspecs)
+def _pick(source, spec):
+  rettype, prefix, keys, rkeys, rkeyset, subspecs = spec
   if not source:
     return rettype()
   if prefix is not None:
@@ -316,31 +1501,41 @@ def pick(source, *keys, **kws):
       items = source.items()
     except AttributeError:
       items = None
-    if items is not None:
-      source = {k[len(prefix):]: v
+    if items is not None and hasattr(source, 'iterprefix') and keys:
+      source = {k: source[prefix + k]
+                for k in rkeys
+                if isstr(k) and prefix + k in source}
+    elif items is not None and hasattr(source, 'iterprefix'):
+      source = {k[len(prefix):]: v for k, v in source.iterprefix(prefix)}
+    elif items is not None:
+      plen   = len(prefix)
+      source = {k[plen:]: v
                 for k, v in items
-                if getattr(k, 'startswith', lambda x: False)(prefix)}
+                if isinstance(k, _strtypes) and k.startswith(prefix)}
     else:
-      source = {attr[len(prefix):]: getattr(source, attr)
-                for attr in properties(source)
-                if attr.startswith(prefix)}
+      if keys:
+        match = lambda attr: attr.startswith(prefix) and attr[len(prefix):] in rkeyset
+      else:
+        match = lambda attr: attr.startswith(prefix)
+      source = {attr[len(prefix):]: value
+                for attr, value in _attrvalues(source, match=match)}
   if len(keys) <= 0:
     if prefix is not None:
       return rettype(source)
     return rettype()
-  rkeys = keys
-  if tree:
-    rkeys = [key.split('.', 1)[0] for key in rkeys]
-  try:
-    ret = rettype({k: v for k, v in source.items() if k in rkeys})
-  except AttributeError:
-    ret = rettype({k: getattr(source, k) for k in rkeys if hasattr(source, k)})
-  if tree:
-    for key in keys:
-      if '.' in key:
-        key, rem = key.split('.', 1)
-        if key in ret:
-          ret[key] = pick(ret[key], rem, dict=rettype, prefix=prefix, tree=tree)
+  if hasattr(source, 'iterprefix'):
+    # indexed mappings (e.g. `FlatStore`) look up the requested keys
+    # directly rather than decoding every item
+    ret = rettype({k: source[k] for k in rkeys if k in source})
+  else:
+    try:
+      ret = rettype({k: v for k, v in source.items() if k in rkeyset})
+    except AttributeError:
+      ret = {k: getattr(source, k, _missing) for k in rkeys}
+      ret = rettype({k: v for k, v in ret.items() if v is not _missing})
+  for key, subspec in subspecs:
+    if key in ret:
+      ret[key] = _pick(ret[key], subspec)
   return ret
 
 #------------------------------------------------------------------------------
@@ -356,13 +1551,9 @@ def omit(source, *keys, **kws):
 
   * `tree` support added in version 0.1.3.
   '''
-  rettype = kws.pop('dict', dict)
-  prefix  = kws.pop('prefix', None)
-  tree    = kws.pop('tree', False)
-  if kws:
-    raise ValueError('invalid omit keyword arguments: %r' % (kws.keys(),))
-  if prefix is not None and tree:
-    raise ValueError('`prefix` and `tree` currently cannot be used together')
+  return _omit(source, _pickspec('omit', keys, kws))
+def _omit(source, spec):
+  rettype, prefix, keys, rkeys, rkeyset, subspecs = spec
   if not source:
     return rettype()
   if prefix is not None:
@@ -370,39 +1561,40 @@ def omit(source, *keys, **kws):
       items = source.items()
     except AttributeError:
       items = None
-    if items is not None:
+    if items is not None and hasattr(source, 'iterprefix'):
+      source = dict(source.iterprefix(prefix, exclude=True))
+    elif items is not None:
+      # note: the prefix and key exclusions are applied in one pass so
+      #       that the (common) flat-dict case does not copy twice.
       source = {k: v
                 for k, v in items
-                if not getattr(k, 'startswith', lambda x: False)(prefix)}
+                if not ( isinstance(k, _strtypes) and k.startswith(prefix) )
+                and k not in rkeyset}
+      if not subspecs:
+        return rettype(source)
     else:
-      source = {attr: getattr(source, attr)
-                for attr in properties(source)
-                if not attr.startswith(prefix)}
+      source = {attr: value
+                for attr, value in _attrvalues(
+                  source, match=lambda attr: not attr.startswith(prefix))}
   # if len(keys) <= 0:
   #   try:
   #     return rettype(source)
   #   except TypeError:
   #     return rettype({k: v for k, v in properties(source)})
-  rkeys = keys
-  if tree:
-    rkeys = [key for key in rkeys if '.' not in key]
   try:
-    ret = rettype({k: v for k, v in source.items() if k not in rkeys})
+    ret = rettype({k: v for k, v in source.items() if k not in rkeyset})
   except AttributeError:
     try:
       ret = rettype({k: getattr(source, k)
                      for k in iter(source)
-                     if k not in rkeys})
+                     if k not in rkeyset})
     except TypeError:
-      ret = rettype({k: getattr(source, k)
-                     for k in properties(source)
-                     if k not in rkeys})
-  if tree:
-    for key in keys:
-      if '.' in key:
-        key, rem = key.split('.', 1)
-        if key in ret:
-          ret[key] = omit(ret[key], rem, dict=rettype, prefix=prefix, tree=tree)
+      ret = rettype({k: v
+                     for k, v in _attrvalues(
+                       source, match=lambda k: k not in rkeyset)})
+  for key, subspec in subspecs:
+    if key in ret:
+      ret[key] = _omit(ret[key], subspec)
   return ret
 
 #------------------------------------------------------------------------------
@@ -474,6 +1666,145 @@ def xform(value, xformer):
     return xformer(curval, root=value, **kws)
   return _xform(value)
 
+#------------------------------------------------------------------------------
+def pick_many(sources, *keys, **kws):
+  '''
+  Batch version of :func:`pick`: returns a generator of the results of
+  calling ``pick(source, *keys, **kws)`` for each item of the iterable
+  `sources`, in order. The `keys` and keyword arguments are validated
+  and pre-processed only once (so invalid arguments are reported
+  immediately, not when the generator is consumed). The following
+  additional keyword arguments are accepted:
+
+  * `executor`: specifies how the records are processed. If ``None``
+    (the default) or ``"serial"``, they are processed serially in the
+    calling thread. If ``"thread"`` or ``"process"``, a temporary
+    `concurrent.futures` thread or process pool is used (note that
+    thread pools only help on free-threaded python builds or when the
+    sources are slow to access, and process pools require the sources,
+    results and `dict` class to be picklable). Otherwise, it must be
+    a `concurrent.futures.Executor`, which is not shut down.
+
+  * `chunksize`: the number of records that are handed to the
+    executor as a single unit of work (defaults to 256).
+
+  For example:
+
+  .. code:: python
+
+    for ret in morph.pick_many(records, 'id', 'name', executor='process'):
+      ...
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  executor, chunksize = _manyspec(kws)
+  spec = _pickspec('pick', keys, kws)
+  return _mapmany(
+    functools.partial(_pickchunk, spec), sources, executor, chunksize)
+def _pickchunk(spec, chunk):
+  return [_pick(source, spec) for source in chunk]
+
+#------------------------------------------------------------------------------
+def omit_many(sources, *keys, **kws):
+  '''
+  Batch version of :func:`omit`; see :func:`pick_many` for details.
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  executor, chunksize = _manyspec(kws)
+  spec = _pickspec('omit', keys, kws)
+  return _mapmany(
+    functools.partial(_omitchunk, spec), sources, executor, chunksize)
+def _omitchunk(spec, chunk):
+  return [_omit(source, spec) for source in chunk]
+
+#------------------------------------------------------------------------------
+def xform_many(values, xformer, **kws):
+  '''
+  Batch version of :func:`xform`: returns a generator of the results
+  of calling ``xform(value, xformer)`` for each item of the iterable
+  `values`, in order. Accepts the same `executor` and `chunksize`
+  keyword arguments as :func:`pick_many` (note that process pools
+  require `xformer` to be picklable, i.e. a module-level function).
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  executor, chunksize = _manyspec(kws)
+  if kws:
+    raise ValueError('invalid xform_many keyword arguments: %r' % (kws.keys(),))
+  return _mapmany(
+    functools.partial(_xformchunk, xformer), values, executor, chunksize)
+def _xformchunk(xformer, chunk):
+  return [xform(value, xformer) for value in chunk]
+
+#------------------------------------------------------------------------------
+def _manyspec(kws):
+  executor  = kws.pop('executor', None)
+  chunksize = kws.pop('chunksize', 256)
+  if not isinstance(chunksize, _inttypes) or isinstance(chunksize, bool) \
+      or chunksize < 1:
+    raise ValueError(
+      'invalid chunksize (must be a positive integer): %r' % (chunksize,))
+  if executor is None or ( isstr(executor)
+                           and executor in ('serial', 'thread', 'process') ):
+    return executor, chunksize
+  if isstr(executor) or not callable(getattr(executor, 'submit', None)):
+    raise ValueError(
+      'invalid executor (must be "serial", "thread", "process" or an'
+      ' Executor): %r' % (executor,))
+  return executor, chunksize
+def _chunked(items, chunksize):
+  items = iter(items)
+  while True:
+    chunk = list(itertools.islice(items, chunksize))
+    if not chunk:
+      return
+    yield chunk
+def _mapmany(func, items, executor, chunksize):
+  chunks = _chunked(items, chunksize)
+  if executor is None or executor == 'serial':
+    for chunk in chunks:
+      for ret in func(chunk):
+        yield ret
+    return
+  cpus  = getattr(os, 'cpu_count', lambda: None)() or 1
+  owned = isstr(executor)
+  if owned:
+    from concurrent import futures
+    if executor == 'thread':
+      executor = futures.ThreadPoolExecutor(cpus)
+    else:
+      executor = futures.ProcessPoolExecutor(cpus)
+  # note: not using `executor.map` because it submits all the chunks
+  #       up front; instead, a bounded window of chunks is kept in
+  #       flight and collected in order.
+  window  = 4 * cpus
+  pending = collections.deque()
+  try:
+    for chunk in chunks:
+      pending.append(executor.submit(func, chunk))
+      if len(pending) >= window:
+        for ret in pending.popleft().result():
+          yield ret
+    while pending:
+      for ret in pending.popleft().result():
+        yield ret
+  finally:
+    for future in pending:
+      future.cancel()
+    if owned:
+      executor.shutdown()
+
+#------------------------------------------------------------------------------
+if sys.version_info >= (3, 5):
+  from .aio import axform
+
 #------------------------------------------------------------------------------
 # end of $Id$
 # $ChangeLog$
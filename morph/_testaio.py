@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#------------------------------------------------------------------------------
+# file: $Id$
+# auth: metagriffin <mg.github@uberdev.org>
+# date: 2026/10/19
+# copy: (C) Copyright 2013-EOT metagriffin -- see LICENSE.txt
+#------------------------------------------------------------------------------
+# This software is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#------------------------------------------------------------------------------
+
+# note: this module uses `async` syntax and is therefore only imported
+#       by `morph.test` on python 3.5+.
+
+import asyncio
+
+#------------------------------------------------------------------------------
+class Service(object):
+  '''
+  A local stand-in for an I/O-bound name lookup service, which records
+  each lookup and the peak number of concurrent lookups.
+  '''
+
+  def __init__(self):
+    self.calls    = []
+    self.inflight = 0
+    self.peak     = 0
+
+  async def lookup(self, value, **kws):
+    self.calls.append(value)
+    self.inflight += 1
+    self.peak = max(self.peak, self.inflight)
+    await asyncio.sleep(0)
+    self.inflight -= 1
+    return 'name-' + str(value) if isinstance(value, int) else value
+
+#------------------------------------------------------------------------------
+def run(coro):
+  '''
+  Runs `coro` to completion on a new event loop and returns its result.
+  '''
+  loop = asyncio.new_event_loop()
+  try:
+    return loop.run_until_complete(coro)
+  finally:
+    loop.close()
+
+#------------------------------------------------------------------------------
+# end of $Id$
+#------------------------------------------------------------------------------
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#------------------------------------------------------------------------------
+# file: $Id$
+# auth: metagriffin <mg.github@uberdev.org>
+# date: 2026/10/19
+# copy: (C) Copyright 2013-EOT metagriffin -- see LICENSE.txt
+#------------------------------------------------------------------------------
+# This software is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#------------------------------------------------------------------------------
+
+# note: this module uses `async` syntax and is therefore only imported
+#       by `morph` on python 3.5+.
+
+import asyncio
+import inspect
+
+from . import isseq, isdict
+
+#------------------------------------------------------------------------------
+async def axform(value, xformer, concurrency=None, dedup=False):
+  '''
+  Asynchronous version of :func:`morph.xform`: recursively transforms
+  `value` by calling `xformer` on all keys & values in dictionaries
+  and all values in sequences, with exactly the same parameters as
+  `xform`. The returned structure is identical to what `xform` would
+  return. `xformer` may be a coroutine function (or return any other
+  awaitable), which allows I/O-bound transformations (e.g. resolving
+  IDs via a cache or service) to run concurrently.
+
+  If `concurrency` is specified, at most that many calls to `xformer`
+  will be in progress at any time; otherwise all leaf transformations
+  are scheduled at once.
+
+  If `dedup` is truthy, `xformer` is only called once for each
+  distinct (hashable) leaf value and the result is re-used for all
+  other occurrences of that value. Note that in this case `xformer`
+  only receives the keyword parameters of the first occurrence, so
+  it should only depend on the value being transformed.
+
+  Examples:
+
+  Resolve only the values of "user" keys (note that this cannot use
+  `dedup`, since the transformer depends on `item_key`)::
+
+    async def resolve_users(value, **kws):
+      if kws.get('item_key') == 'user':
+        return await service.lookup_name(value)
+      return value
+
+    copy = await morph.axform(value, resolve_users, concurrency=8)
+
+  Resolve every integer leaf, looking up each distinct ID only once::
+
+    async def resolve_ids(value, **kws):
+      if isinstance(value, int):
+        return await service.lookup_name(value)
+      return value
+
+    copy = await morph.axform(value, resolve_ids, concurrency=8, dedup=True)
+
+  :ChangeLog:
+
+  * Added in version 0.1.6.
+  '''
+  if concurrency is not None and concurrency < 1:
+    raise ValueError(
+      'invalid axform concurrency (must be a positive integer): %r'
+      % (concurrency,))
+  calls = []
+  slots = dict() if dedup else None
+
+  def _leaf(curval, kws):
+    if slots is not None:
+      try:
+        key = (type(curval), curval)
+        if key in slots:
+          return slots[key]
+        slots[key] = len(calls)
+      except TypeError:
+        # unhashable leaf values are not de-duplicated
+        pass
+    calls.append((curval, kws))
+    return len(calls) - 1
+
+  def _plan(curval, **kws):
+    # leaves are planned as call indices, sequences as lists and dicts
+    # as tuples of (key, value) plans
+    if isseq(curval):
+      return [
+        _plan(val, index=idx, seq=curval)
+        for idx, val in enumerate(curval) ]
+    if isdict(curval):
+      return tuple(
+        (_plan(key, item_value=val, dict=curval), _plan(val, item_key=key, dict=curval))
+        for key, val in curval.items() )
+    return _leaf(curval, kws)
+
+  plan    = _plan(value)
+  results = [None] * len(calls)
+  pending = iter(range(len(calls)))
+
+  async def _worker():
+    for idx in pending:
+      curval, kws = calls[idx]
+      ret = xformer(curval, root=value, **kws)
+      if inspect.isawaitable(ret):
+        ret = await ret
+      results[idx] = ret
+
+  count   = len(calls) if not concurrency else min(concurrency, len(calls))
+  workers = [asyncio.ensure_future(_worker()) for _ in range(count)]
+  try:
+    await asyncio.gather(*workers)
+  except BaseException:
+    for worker in workers:
+      worker.cancel()
+    raise
+
+  def _build(cur):
+    if isinstance(cur, int):
+      return results[cur]
+    if isinstance(cur, list):
+      return [_build(sub) for sub in cur]
+    return {_build(key): _build(val) for key, val in cur}
+  return _build(plan)
+
+#------------------------------------------------------------------------------
+# end of $Id$
+#------------------------------------------------------------------------------
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+#------------------------------------------------------------------------------
+# file: $Id$
+# auth: metagriffin <mg.github@uberdev.org>
+# date: 2026/10/19
+# copy: (C) Copyright 2013-EOT metagriffin -- see LICENSE.txt
+#------------------------------------------------------------------------------
+# This software is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see http://www.gnu.org/licenses/.
+#------------------------------------------------------------------------------
+
+'''
+The ``morph`` command-line tool, which applies morph operations to
+newline-delimited JSON (NDJSON) records, e.g.::
+
+  morph flatten -j 4 -i data.ndjson > flat.ndjson
+  cat flat.ndjson | morph pick --prefix 'services[0].' > service0.ndjson
+'''
+
+import sys
+import json
+import mmap
+import time
+import argparse
+import functools
+import collections
+import multiprocessing
+
+import morph
+
+#------------------------------------------------------------------------------
+
+READSIZE  = 1 << 20
+BATCHSIZE = 1000
+COMMANDS  = ('flatten', 'unflatten', 'pick', 'omit', 'tobool')
+
+#------------------------------------------------------------------------------
+def apply(spec, record):
+  '''
+  Applies the operation described by `spec` (a tuple of ``(command,
+  keys, prefix, tree, strict)``) to the decoded JSON `record`.
+  '''
+  command, keys, prefix, tree, strict = spec
+  if command == 'flatten':
+    return morph.flatten(record)
+  if command == 'unflatten':
+    return morph.unflatten(record)
+  if command == 'pick':
+    return morph.pick(record, *keys, prefix=prefix, tree=tree)
+  if command == 'omit':
+    return morph.omit(record, *keys, prefix=prefix, tree=tree)
+  if command == 'tobool':
+    default = ValueError if strict else False
+    if not keys:
+      return morph.tobool(record, default=default)
+    if not morph.isdict(record):
+      raise ValueError(
+        'cannot convert keys of non-dict record: %r' % (record,))
+    return {key: morph.tobool(val, default=default) if key in keys else val
+            for key, val in record.items()}
+  raise ValueError('unknown morph command: %r' % (command,))
+
+#------------------------------------------------------------------------------
+def process(spec, lines, source='-', start=1):
+  '''
+  Applies `spec` to each of the NDJSON `lines` (bytes), skipping
+  blank lines, and returns a tuple of ``(output, count)``, where
+  `output` is the encoded NDJSON output and `count` is the number of
+  records processed. This is the unit of work that is distributed to
+  the worker processes.
+
+  `source` and `start` identify the input file and the line number of
+  the first line in `lines`; they are only used to locate the
+  offending record when it cannot be decoded or morphed, in which
+  case a ValueError is raised.
+  '''
+  out = []
+  for lineno, line in enumerate(lines, start):
+    if not line.strip():
+      continue
+    try:
+      record = json.loads(line.decode('utf-8'))
+      out.append(json.dumps(apply(spec, record), separators=(',', ':')))
+    except (ValueError, TypeError, AttributeError, KeyError) as err:
+      raise ValueError('%s:%d: %s' % (
+        '<stdin>' if source == '-' else source, lineno, err))
+  if not out:
+    return b'', 0
+  return ( '\n'.join(out) + '\n' ).encode('utf-8'), len(out)
+
+#------------------------------------------------------------------------------
+def readbatches(fp, batchsize=BATCHSIZE, readsize=READSIZE):
+  '''
+  Reads `fp` (a binary file-like or ``mmap.mmap`` object) in chunks of
+  `readsize` bytes and generates lists of at most `batchsize` lines.
+  '''
+  batch = []
+  rem   = b''
+  while True:
+    chunk = fp.read(readsize)
+    if not chunk:
+      break
+    lines = ( rem + chunk ).split(b'\n')
+    rem   = lines.pop()
+    while lines:
+      room = batchsize - len(batch)
+      batch.extend(lines[:room])
+      del lines[:room]
+      if len(batch) >= batchsize:
+        yield batch
+        batch = []
+  if rem:
+    batch.append(rem)
+  if batch:
+    yield batch
+
+#------------------------------------------------------------------------------
+def openinput(path, usemmap=False):
+  if path == '-':
+    return getattr(sys.stdin, 'buffer', sys.stdin)
+  fp = open(path, 'rb', READSIZE)
+  if not usemmap:
+    return fp
+  try:
+    buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+  except ValueError:
+    # empty files cannot be memory-mapped
+    return fp
+  fp.close()
+  return buf
+
+#------------------------------------------------------------------------------
+def run(options, outfp, errfp):
+  spec  = (options.command, tuple(options.keys or ()),
+           options.prefix, options.tree, options.strict)
+  stats = dict(records=0, bytesin=0, bytesout=0)
+  start = time.time()
+
+  def _batches():
+    for path in options.input or ['-']:
+      fp = openinput(path, options.mmap)
+      try:
+        lineno = 1
+        for batch in readbatches(fp, options.batch):
+          stats['bytesin'] += sum(len(line) + 1 for line in batch)
+          yield (batch, path, lineno)
+          lineno += len(batch)
+      finally:
+        if fp is not getattr(sys.stdin, 'buffer', sys.stdin):
+          fp.close()
+
+  def _emit(result):
+    output, count = result
+    outfp.write(output)
+    stats['records']  += count
+    stats['bytesout'] += len(output)
+
+  if options.jobs <= 1:
+    for args in _batches():
+      _emit(process(spec, *args))
+  else:
+    # note: not using `pool.imap` because it consumes the entire
+    #       input eagerly; instead, a bounded window of batches is kept
+    #       in flight and collected in order.
+    pool    = multiprocessing.Pool(options.jobs)
+    work    = functools.partial(process, spec)
+    pending = collections.deque()
+    try:
+      for args in _batches():
+        pending.append(pool.apply_async(work, args))
+        if len(pending) >= options.jobs * 2:
+          _emit(pending.popleft().get())
+      while pending:
+        _emit(pending.popleft().get())
+    finally:
+      pool.terminate()
+      pool.join()
+  outfp.flush()
+
+  if not options.quiet:
+    elapsed = max(time.time() - start, 1e-9)
+    errfp.write(
+      'morph: %s: %d records, %.1f MB in, %.1f MB out, %.2fs'
+      ' (%d records/s, %.1f MB/s)\n'
+      % (options.command, stats['records'], stats['bytesin'] / 1e6,
+         stats['bytesout'] / 1e6, elapsed, stats['records'] / elapsed,
+         stats['bytesin'] / 1e6 / elapsed))
+  return stats
+
+#------------------------------------------------------------------------------
+def main(args=None):
+  common = argparse.ArgumentParser(add_help=False)
+  common.add_argument(
+    '-i', '--input', metavar='FILENAME', action='append',
+    help='read NDJSON records from FILENAME instead of stdin ("-");'
+    ' can be specified multiple times')
+  common.add_argument(
+    '-o', '--output', metavar='FILENAME',
+    help='write NDJSON records to FILENAME instead of stdout')
+  common.add_argument(
+    '-m', '--mmap', action='store_true',
+    help='memory-map input files instead of reading them')
+  common.add_argument(
+    '-j', '--jobs', metavar='N', type=int, default=1,
+    help='process records in N parallel worker processes (output order'
+    ' is preserved)')
+  common.add_argument(
+    '-b', '--batch', metavar='N', type=int, default=BATCHSIZE,
+    help='number of records per unit of work [default: %(default)s]')
+  common.add_argument(
+    '-q', '--quiet', action='store_true',
+    help='do not print throughput statistics to stderr')
+
+  cli = argparse.ArgumentParser(
+    prog='morph',
+    description='Applies morph operations to NDJSON records.')
+  subs = cli.add_subparsers(dest='command', metavar='COMMAND')
+  subs.required = True
+  subs.add_parser(
+    'flatten', parents=[common],
+    help='flatten each record (see `morph.flatten`)')
+  subs.add_parser(
+    'unflatten', parents=[common],
+    help='unflatten each record (see `morph.unflatten`)')
+  for command, desc in (('pick', 'select'), ('omit', 'remove')):
+    sub = subs.add_parser(
+      command, parents=[common],
+      help='%s keys from each record (see `morph.%s`)' % (desc, command))
+    sub.add_argument('keys', metavar='KEY', nargs='*')
+    sub.add_argument(
+      '-p', '--prefix', metavar='PREFIX',
+      help='%s keys that start with PREFIX' % (desc,))
+    sub.add_argument(
+      '-t', '--tree', action='store_true',
+      help='evaluate KEYs as hierarchical key specifications')
+  sub = subs.add_parser(
+    'tobool', parents=[common],
+    help='convert each record (or the values of the specified keys)'
+    ' to a boolean (see `morph.tobool`)')
+  sub.add_argument('keys', metavar='KEY', nargs='*')
+  sub.add_argument(
+    '-s', '--strict', action='store_true',
+    help='fail on values that are neither truthy nor falsy')
+
+  options = cli.parse_args(args)
+  for attr, default in (('keys', None), ('prefix', None), ('tree', False), ('strict', False)):
+    if not hasattr(options, attr):
+      setattr(options, attr, default)
+  if options.jobs < 1 or options.batch < 1:
+    cli.error('--jobs and --batch must be positive integers')
+  if options.prefix is not None and options.tree:
+    cli.error('--prefix and --tree cannot be used together')
+
+  stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+  outfp  = stdout
+  try:
+    if options.output and options.output != '-':
+      outfp = open(options.output, 'wb', READSIZE)
+    run(options, outfp, sys.stderr)
+  except (ValueError, IOError) as err:
+    sys.stderr.write('morph: error: %s\n' % (err,))
+    return 1
+  finally:
+    if outfp is not stdout:
+      outfp.close()
+  return 0
+
+#------------------------------------------------------------------------------
+# end of $Id$
+#------------------------------------------------------------------------------
@@ -19,7 +19,17 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 #------------------------------------------------------------------------------
 
+import io
+import sys
+import copy
+import os
+import json
+import types
+import shutil
+import mmap
+import tempfile
 import unittest
+import collections
 
 import morph
 
@@ -100,6 +110,48 @@ class TestMorph(unittest.TestCase):
     self.assertTrue(morph.isprimitive(( [ None ], dict(foo=[ b'bar', u'bar' ]) )))
     self.assertFalse(morph.isprimitive([ self, unittest.TestCase ]))
 
+  #----------------------------------------------------------------------------
+  def test_isprimitive_cycle(self):
+    src = [1, 2]
+    src.append(src)
+    self.assertFalse(morph.isprimitive(src))
+    shared = [1, 2]
+    self.assertTrue(morph.isprimitive([shared, {'a': shared}]))
+
+  #----------------------------------------------------------------------------
+  def test_isprimitive_cache(self):
+    cache = dict()
+    frozen = (1, ('a', b'b'), frozenset([3]))
+    self.assertTrue(morph.isprimitive([frozen, frozen], cache=cache))
+    self.assertIs(cache[id(frozen)], frozen)
+    thawed = (1, [2])
+    self.assertTrue(morph.isprimitive(thawed, cache=cache))
+    self.assertNotIn(id(thawed), cache)
+    thawed[1].append(self)
+    self.assertFalse(morph.isprimitive(thawed, cache=cache))
+    if hasattr(types, 'MappingProxyType'):
+      under = {'a': 1}
+      proxy = types.MappingProxyType(under)
+      self.assertTrue(morph.isprimitive((proxy,), cache=cache))
+      under['b'] = self
+      self.assertFalse(morph.isprimitive(proxy, cache=cache))
+      self.assertFalse(morph.isprimitive((proxy,), cache=cache))
+
+  #----------------------------------------------------------------------------
+  def test_checkprimitive(self):
+    src = {'a': [1, {'b': None}]}
+    self.assertIs(morph.checkprimitive(src), src)
+    with self.assertRaises(ValueError) as cm:
+      morph.checkprimitive({'a': [1, {'b': self}]})
+    self.assertEqual(
+      str(cm.exception),
+      'non-primitive value at "a[1].b": %r' % (self,))
+    with self.assertRaises(ValueError) as cm:
+      morph.checkprimitive([0, {(1, self): 'x'}])
+    self.assertEqual(
+      str(cm.exception),
+      'non-primitive key in "[1]": %r' % ((1, self),))
+
   #----------------------------------------------------------------------------
   def test_tobool(self):
     self.assertTrue(morph.tobool('true'))
@@ -150,6 +202,50 @@ class TestMorph(unittest.TestCase):
        'a.b[1][2]':   6,
       })
 
+  #----------------------------------------------------------------------------
+  def test_iterflatten_json(self):
+    src = {'a': {'b': 1, 'c': [2.5, {'d': None, 'e': [True, False]}]},
+           'f': u'z\u00efg "z\u00e4g"', 'g': {}, 'h': [[], [-3e-2]]}
+    data = json.dumps(src)
+    for chunksize in (1, 3, 65536):
+      self.assertEqual(
+        dict(morph.iterflatten_json(data.encode('utf-8'), chunksize=chunksize)),
+        morph.flatten(src))
+      self.assertEqual(
+        dict(morph.iterflatten_json(io.StringIO(data), chunksize=chunksize)),
+        morph.flatten(src))
+    self.assertEqual(
+      list(morph.iterflatten_json(
+        io.BytesIO(b'{"a": [1, {"b": 2}]}\n\n{"c": "d"}\n'), lines=True)),
+      [{'a[0]': 1, 'a[1].b': 2}, {'c': 'd'}])
+    with tempfile.TemporaryFile() as fp:
+      fp.write(data.encode('utf-8'))
+      fp.flush()
+      buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+      try:
+        self.assertEqual(
+          dict(morph.iterflatten_json(buf, chunksize=7)), morph.flatten(src))
+      finally:
+        buf.close()
+
+  #----------------------------------------------------------------------------
+  def test_iterflatten_json_fail(self):
+    with self.assertRaises(ValueError) as cm:
+      list(morph.iterflatten_json('[1, 2]'))
+    self.assertEqual(
+      str(cm.exception),
+      'only JSON objects can be flattened, not an array')
+    with self.assertRaises(ValueError) as cm:
+      list(morph.iterflatten_json('{"a": [1, 2}'))
+    self.assertEqual(str(cm.exception), 'unexpected "}" at offset 11')
+    with self.assertRaises(ValueError) as cm:
+      list(morph.iterflatten_json('{"a": 1'))
+    self.assertEqual(str(cm.exception), 'unexpected end of JSON input at offset 7')
+    with self.assertRaises(ValueError) as cm:
+      list(morph.iterflatten_json('{"a": 1} {"b": 2}'))
+    self.assertEqual(
+      str(cm.exception), 'unexpected JSON data after top-level object')
+
   #----------------------------------------------------------------------------
   def test_unflatten_fail(self):
     with self.assertRaises(ValueError) as cm:
@@ -195,6 +291,195 @@ class TestMorph(unittest.TestCase):
         }),
       {'a': {'b': [[1, 2], [3, {'x': 4, 'y': 5}, 6]]}})
 
+  #----------------------------------------------------------------------------
+  def test_unflatten_into(self):
+    src = {'a': {'b': 1}, 'c': [{'d': 2}, {'d': 3}], 't': (1, 2)}
+    ret = morph.unflatten_into(src, {
+      'a.x': 'ex', 'c[1].d': 'dee', 'c[3]': 4, 'e[0].f': 5, 't[2]': 3})
+    self.assertIs(ret, src)
+    self.assertEqual(src, {
+      'a': {'b': 1, 'x': 'ex'},
+      'c': [{'d': 2}, {'d': 'dee'}, None, 4],
+      'e': [{'f': 5}],
+      't': [1, 2, 3],
+    })
+    self.assertEqual(
+      morph.unflatten_into(src, {'e[0]': 'eff'}, delete=['c[0]', 'c[1]', 'a.b', 'no.such']),
+      {'a': {'x': 'ex'}, 'c': [None, 4], 'e': ['eff'], 't': [1, 2, 3]})
+
+  #----------------------------------------------------------------------------
+  def test_unflatten_into_fail(self):
+    src  = {'a': 'b', 'c': [1, (2, 3)], 'd': {'e': 'f'}}
+    orig = copy.deepcopy(src)
+    for updates, delete, message in (
+        ({'a.b': 'c'}, None,
+         'conflicting scalar vs. structure for prefix: a'),
+        ({'z': 1, 'c.d': 'e'}, None,
+         'conflicting structures (dict vs. list) for prefix: c'),
+        ({'x.b': 'c', 'x[0]': 'no'}, None,
+         'conflicting structures (dict vs. list) for prefix: x'),
+        ({'y.b': 'c', 'y': 'no'}, None,
+         'conflicting scalar vs. structure for prefix: y'),
+        ({'c[NADA]': 'b'}, None,
+         'invalid list syntax (bad index) in key "c[NADA]"'),
+        ({'c[3]': 'y', 'd.x': 1, 'd.e': 'g', 'c[0].k': 'v'}, ['a', 'c[0]'],
+         'conflicting structures (dict vs. list) for prefix: c[0]'),
+        ({'a': 'x'}, ['c[1][0]', 'd.e', 'q[NADA]'],
+         'invalid list syntax (bad index) in key "q[NADA]"'),
+      ):
+      with self.assertRaises(ValueError) as cm:
+        morph.unflatten_into(src, updates, delete=delete)
+      self.assertEqual(str(cm.exception), message)
+      self.assertEqual(src, orig)
+      self.assertIsInstance(src['c'][1], tuple)
+
+  #----------------------------------------------------------------------------
+  def test_iterunflatten(self):
+    src = {
+      'a':       'A',
+      'b.x':     1,
+      'b.y[0]':  2,
+      'b.y[1]':  3,
+      'c[0].z':  4,
+      'c[1]':    5,
+    }
+    ret = morph.iterunflatten(sorted(src.items()))
+    self.assertEqual(next(ret), ('a', 'A'))
+    self.assertEqual(next(ret), ('b', {'x': 1, 'y': [2, 3]}))
+    self.assertEqual(list(ret), [('c', [{'z': 4}, 5])])
+    self.assertEqual(dict(morph.iterunflatten(src)), morph.unflatten(src))
+    mixed = collections.OrderedDict([('a.x', 1), ('b', 2), ('a0', 3), ('a.y', 4)])
+    self.assertEqual(
+      list(morph.iterunflatten(mixed)),
+      [('a', {'x': 1, 'y': 4}), ('a0', 3), ('b', 2)])
+    self.assertEqual(dict(morph.iterunflatten(mixed)), morph.unflatten(mixed))
+    with self.assertRaises(ValueError) as cm:
+      list(morph.iterunflatten([('a.x', 1), ('a0', 2), ('a[0]', 3)]))
+    self.assertEqual(
+      str(cm.exception),
+      'record prefix "a" re-appears in non-consecutive pairs (key "a[0]")')
+    rows = [('u[0].n', 'a'), ('u[0].i', 1), ('u[1].n', 'b')]
+    self.assertEqual(
+      list(morph.iterunflatten(rows, record_key=lambda key: key[:key.index(']') + 1])),
+      [('u[0]', {'n': 'a', 'i': 1}), ('u[1]', {'n': 'b'})])
+    with self.assertRaises(ValueError) as cm:
+      list(morph.iterunflatten([('a', 1), ('a.b', 2)]))
+    self.assertEqual(
+      str(cm.exception),
+      'conflicting scalar vs. structure for prefix: a')
+
+  #----------------------------------------------------------------------------
+  def test_digest(self):
+    src = {'a': {'b': 1, 'c': [2.5, {'d': None, 'e': u'x'}, {}]}, 'f': u'g', 'h': []}
+    ref = morph.digest(src)
+    self.assertEqual(len(ref), 64)
+    self.assertEqual(morph.digest(collections.OrderedDict(reversed(list(src.items())))), ref)
+    self.assertEqual(morph.digest_flat(morph.flatten(src)), ref)
+    self.assertEqual(
+      morph.digest({'a': {'b': 1, 'c': (2.5, {'e': u'x', 'd': None})}, 'f': u'g'}), ref)
+    self.assertEqual(morph.digest_flat({}), morph.digest({}))
+    self.assertTrue(morph.isprimitive({(): 1, frozenset(): 2}))
+    self.assertEqual(len(set(morph.digest(val) for val in (
+      {(): 1}, {frozenset(): 1}, {(1,): 1}, {(): 2}))), 3)
+    self.assertNotEqual(morph.digest({(): 1}), morph.digest({'a': 1}))
+    self.assertEqual(
+      len(set(morph.digest({'a': val}) for val in (1, 1.0, True, '1', b'1', [1]))), 6)
+    self.assertNotEqual(morph.digest({'a': [1, 2]}), morph.digest({'a': [2, 1]}))
+    self.assertEqual(
+      morph.digest({'a': 1}, algo='md5'), morph.digest_flat({'a': 1}, algo='md5'))
+    with self.assertRaises(ValueError) as cm:
+      morph.digest({'a': self})
+    self.assertEqual(
+      str(cm.exception), 'cannot digest non-primitive value: %r' % (self,))
+
+  #----------------------------------------------------------------------------
+  def test_digest_memo(self):
+    memo = dict()
+    sub  = ('x', (1, 2))
+    ref  = morph.digest({'a': ['x', [1, 2]], 'b': ['x', [1, 2]]})
+    self.assertEqual(morph.digest({'a': sub, 'b': sub}, memo=memo), ref)
+    self.assertEqual(memo[id(sub)][0], sub)
+    self.assertEqual(morph.digest({'a': sub, 'b': sub}, memo=memo), ref)
+    thawed = ('x', [1, 2])
+    self.assertEqual(morph.digest({'a': thawed, 'b': thawed}, memo=memo), ref)
+    self.assertNotIn(id(thawed), memo)
+    if hasattr(types, 'MappingProxyType'):
+      under = {'a': 1}
+      proxy = types.MappingProxyType(under)
+      old   = morph.digest({'x': proxy}, memo=memo)
+      under['a'] = 2
+      self.assertNotEqual(morph.digest({'x': proxy}, memo=memo), old)
+      self.assertEqual(
+        morph.digest({'x': proxy}, memo=memo), morph.digest({'x': proxy}))
+      self.assertNotIn(id(proxy), memo)
+
+  #----------------------------------------------------------------------------
+  def test_flatstore(self):
+    src = {
+      'name': u'caf\u00e9',
+      'services': [{'port': 80, 'tags': ['a', 'b']}, {'port': 443, 'tls': True}],
+      'services.count': 2,
+      'x': None,
+    }
+    tmpdir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmpdir, 'store.mfs')
+      self.assertEqual(morph.FlatStore.build(path, src), 8)
+      with morph.FlatStore.open(path) as store:
+        flat = morph.flatten(src)
+        self.assertEqual(len(store), len(flat))
+        self.assertEqual(list(store), sorted(flat.keys()))
+        self.assertEqual(dict(store), flat)
+        self.assertEqual(store['services[1].port'], 443)
+        self.assertIsNone(store['x'])
+        self.assertIn('services[0].tags[1]', store)
+        self.assertNotIn('services', store)
+        self.assertNotIn(7, store)
+        with self.assertRaises(KeyError):
+          store['services[2].port']
+        for prefix in ('services', 'services[0].', 'services.', 'z', ''):
+          self.assertEqual(
+            {k[len(prefix):]: v for k, v in store.iterprefix(prefix)},
+            morph.pick(flat, prefix=prefix))
+        calls = []
+        value = store._value
+        store._value = lambda *args: calls.append(args) or value(*args)
+        self.assertEqual(
+          morph.pick(store, 'name', 'x', 'nope', 7),
+          {'name': src['name'], 'x': None})
+        self.assertEqual(
+          morph.pick(store, 'port', 'tls', 'nope', prefix='services[1].'),
+          {'port': 443, 'tls': True})
+        self.assertEqual(len(calls), 4)
+        del store._value
+        self.assertEqual(store.unflatten('services[0]'), src['services'][0])
+        self.assertEqual(store.unflatten('services[1].port'), 443)
+        with self.assertRaises(ValueError):
+          # 'services.count' vs. 'services[0]...'
+          store.unflatten()
+        with self.assertRaises(KeyError):
+          store.unflatten('serv')
+      morph.FlatStore.build(path, [('b', 2), ('a[0]', 1)])
+      with morph.FlatStore.open(path) as store:
+        self.assertEqual(store.unflatten(), {'a': [1], 'b': 2})
+      with self.assertRaises(ValueError) as cm:
+        morph.FlatStore.build(path, [('a', 1), ('a', 2)])
+      self.assertEqual(str(cm.exception), 'duplicate FlatStore key: a')
+      with open(path, 'rb') as fp:
+        data = fp.read()
+      for bad in (b'MORP', data[:len(data) - 1], data[:20], b'XXXXXXXX' + data[8:]):
+        with open(path, 'wb') as fp:
+          fp.write(bad)
+        with self.assertRaises(ValueError):
+          morph.FlatStore.open(path)
+      subdir = os.path.join(tmpdir, 'sub')
+      os.mkdir(subdir)
+      with self.assertRaises(OSError):
+        morph.FlatStore.build(subdir, src)
+      self.assertFalse(os.path.exists(subdir + '.tmp'))
+    finally:
+      shutil.rmtree(tmpdir)
+
   #----------------------------------------------------------------------------
   def test_pick(self):
     class aadict(dict): pass
@@ -203,6 +488,7 @@ class TestMorph(unittest.TestCase):
     self.assertEqual(morph.pick(d, 'foo', dict=aadict), {'foo': 'bar'})
     self.assertEqual(morph.pick(d), {})
     self.assertEqual(morph.pick(d, prefix='zi'), {'g': 87, 'ggy': 78})
+    self.assertEqual(morph.pick({1: 'one', 'zig': 87}, prefix='zi'), {'g': 87})
     self.assertIsInstance(morph.pick(d, 'foo'), dict)
     self.assertNotIsInstance(morph.pick(d, 'foo'), aadict)
     self.assertIsInstance(morph.pick(d, 'foo', dict=aadict), aadict)
@@ -226,6 +512,51 @@ class TestMorph(unittest.TestCase):
       {'1': 'zog', '2': 'zug'})
     self.assertEqual(morph.pick(src), {})
 
+  #----------------------------------------------------------------------------
+  def test_pick_object_plans(self):
+    calls = []
+    class Base(object):
+      kind = 'base'
+      def method(self):
+        pass
+      @property
+      def expensive(self):
+        calls.append('expensive')
+        return 'costly'
+      @property
+      def factory(self):
+        return Base
+    class Slotted(Base):
+      __slots__ = ('foo', 'unset')
+      def __init__(self):
+        self.foo = 'bar'
+    class Plain(Base):
+      def __init__(self):
+        self.foo = 'bar'
+        self.method = 'shadowed'
+    Point = collections.namedtuple('Point', 'x y')
+    for src, expect in (
+        (Slotted(), ['expensive', 'foo', 'kind']),
+        (Plain(), ['expensive', 'foo', 'kind', 'method']),
+        (Point(1, 2), ['x', 'y']),
+      ):
+      self.assertEqual(list(morph.properties(src)), expect)
+      self.assertEqual(
+        list(morph.properties(src)),
+        sorted(attr for attr in dir(src)
+               if not attr.startswith('_')
+               and not callable(getattr(src, attr, None))
+               and hasattr(src, attr)))
+    del calls[:]
+    self.assertEqual(morph.pick(Plain(), 'foo', 'kind'), {'foo': 'bar', 'kind': 'base'})
+    self.assertEqual(morph.pick(Plain(), 'oo', 'ops', prefix='f'), {'oo': 'bar'})
+    self.assertEqual(
+      morph.omit(Plain(), 'expensive'),
+      {'foo': 'bar', 'kind': 'base', 'method': 'shadowed'})
+    self.assertEqual(morph.omit(Slotted(), prefix='exp'), {'foo': 'bar', 'kind': 'base'})
+    self.assertEqual(calls, [])
+    self.assertEqual(morph.pick(Point(1, 2), 'y'), {'y': 2})
+
   #----------------------------------------------------------------------------
   def test_pick_tree(self):
     src = {
@@ -251,6 +582,23 @@ class TestMorph(unittest.TestCase):
     #   morph.pick(src, 'c[].x', tree=True),
     #   {'c': [{'x': 'c0.x'}, {'x': 'c1.x'}]})
 
+  #----------------------------------------------------------------------------
+  def test_pick_omit_prefixindex(self):
+    src = {'a[0].x': 1, 'a[0].y': 2, 'a[1].x': 3, 'a[10].x': 4, 'ab': 5, 'b': 6, 7: 'seven'}
+    index = morph.PrefixIndex(dict(src))
+    for prefix in ('a[0].', 'a[1]', 'a', 'ab', '', 'zz'):
+      self.assertEqual(morph.pick(index, prefix=prefix), morph.pick(src, prefix=prefix))
+      self.assertEqual(morph.omit(index, prefix=prefix), morph.omit(src, prefix=prefix))
+    self.assertEqual(morph.pick(index, 'x', prefix='a[1].'), {'x': 3})
+    index['a[1].z'] = 9
+    index['a[1].x'] = 8
+    del index['a[10].x']
+    del index[7]
+    self.assertEqual(index.index, ['a[0].x', 'a[0].y', 'a[1].x', 'a[1].z', 'ab', 'b'])
+    self.assertEqual(morph.pick(index, prefix='a[1].'), {'x': 8, 'z': 9})
+    self.assertEqual(morph.omit(index, prefix='a'), {'b': 6})
+    self.assertEqual(dict(index), index.mapping)
+
   #----------------------------------------------------------------------------
   def test_omit(self):
     class aadict(dict): pass
@@ -258,6 +606,10 @@ class TestMorph(unittest.TestCase):
     self.assertEqual(morph.omit(d, 'foo'), {'zig': 87, 'ziggy': 78})
     self.assertEqual(morph.omit(d, prefix='zig'), {'foo': 'bar'})
     self.assertEqual(morph.omit(d), {'foo': 'bar', 'zig': 87, 'ziggy': 78})
+    self.assertEqual(
+      morph.omit({1: 'one', 'zig': 87, 'foo': 'bar'}, 'foo', prefix='zig'),
+      {1: 'one'})
+    self.assertIsInstance(morph.omit(d, prefix='zig', dict=aadict), aadict)
 
   #----------------------------------------------------------------------------
   def test_omit_object(self):
@@ -304,6 +656,38 @@ class TestMorph(unittest.TestCase):
     #   morph.omit(src, 'b[].x'),
     #   {'a': 'a', 'b': [{'y': 'b0.y'}, {'y': 'b1.y'}]})
 
+  #----------------------------------------------------------------------------
+  def test_pick_omit_many(self):
+    class aadict(dict): pass
+    src = [{'a': idx, 'b': {'x': idx, 'y': -idx}, 'zig': 'zag'} for idx in range(20)]
+    for executor in (None, 'thread', 'process'):
+      self.assertEqual(
+        list(morph.pick_many(src, 'a', 'b.x', tree=True, executor=executor, chunksize=3)),
+        [morph.pick(item, 'a', 'b.x', tree=True) for item in src])
+      self.assertEqual(
+        list(morph.omit_many(iter(src), prefix='z', executor=executor, chunksize=7)),
+        [morph.omit(item, prefix='z') for item in src])
+    ret = list(morph.pick_many(src[:2], 'a', dict=aadict))
+    self.assertEqual(ret, [{'a': 0}, {'a': 1}])
+    self.assertIsInstance(ret[0], aadict)
+    with self.assertRaises(ValueError) as cm:
+      morph.pick_many(src, 'a', dct=dict)
+    self.assertEqual(
+      str(cm.exception), 'invalid pick keyword arguments: %r' % ({'dct': 0}.keys(),))
+    for kws in (dict(executor='nada'), dict(executor=object()),
+                dict(chunksize=None), dict(chunksize=0), dict(chunksize=2.5)):
+      with self.assertRaises(ValueError):
+        morph.omit_many(src, 'a', **kws)
+
+  #----------------------------------------------------------------------------
+  def test_xform_many(self):
+    double = lambda value, **kws: value * 2
+    src = [[idx, {'k': idx}] for idx in range(10)]
+    for executor in (None, 'thread'):
+      self.assertEqual(
+        list(morph.xform_many(src, double, executor=executor, chunksize=4)),
+        [morph.xform(item, double) for item in src])
+
   #----------------------------------------------------------------------------
   def test_xform_seq(self):
     stack = []
@@ -357,6 +741,85 @@ class TestMorph(unittest.TestCase):
     ], key=str))
 
 
+  #----------------------------------------------------------------------------
+  @unittest.skipUnless(sys.version_info >= (3, 5), 'requires python 3.5+')
+  def test_axform(self):
+    from morph import _testaio
+    src = {'users': [1, 2, 3, 2, 1], 'owner': {'id': 3}, 'n': 'x'}
+    expect = morph.xform(
+      src, lambda val, **kws: 'name-' + str(val) if isinstance(val, int) else val)
+    svc = _testaio.Service()
+    self.assertEqual(
+      _testaio.run(morph.axform(src, svc.lookup, concurrency=2)), expect)
+    self.assertEqual(svc.peak, 2)
+    self.assertEqual(len(svc.calls), 11)
+    svc = _testaio.Service()
+    self.assertEqual(
+      _testaio.run(morph.axform(src, svc.lookup, dedup=True)), expect)
+    self.assertEqual(sorted(svc.calls, key=str), [1, 2, 3, 'id', 'n', 'owner', 'users', 'x'])
+    self.assertEqual(
+      _testaio.run(morph.axform([4, 'foo'], lambda val, **kws: val * 2)),
+      [8, 'foofoo'])
+
+  #----------------------------------------------------------------------------
+  def test_cli(self):
+    import morph.cli
+    records = [{'id': idx, 'a': {'b': [idx, 'on']}} for idx in range(50)]
+    tmpdir = tempfile.mkdtemp()
+    try:
+      src = os.path.join(tmpdir, 'src.ndjson')
+      with open(src, 'wb') as fp:
+        for record in records:
+          fp.write(json.dumps(record).encode('utf-8') + b'\n\n')
+      def _run(*args):
+        out = os.path.join(tmpdir, 'out.ndjson')
+        self.assertEqual(
+          morph.cli.main(list(args) + ['-q', '-i', src, '-o', out]), 0)
+        with open(out, 'rb') as fp:
+          return [json.loads(line.decode('utf-8')) for line in fp]
+      flat = [morph.flatten(record) for record in records]
+      self.assertEqual(_run('flatten'), flat)
+      self.assertEqual(_run('flatten', '-j', '3', '-b', '7', '--mmap'), flat)
+      self.assertEqual(
+        _run('pick', 'a', '-j', '2', '-b', '5'),
+        [{'a': record['a']} for record in records])
+      self.assertEqual(
+        _run('omit', 'a'), [{'id': record['id']} for record in records])
+      self.assertEqual(_run('tobool', '-b', '3'), [True] * len(records))
+      def _fail(*args):
+        stderr = sys.stderr
+        sys.stderr = io.StringIO() if morph.PY3 else io.BytesIO()
+        try:
+          self.assertEqual(morph.cli.main(list(args) + ['-q', '-i', src]), 1)
+          return sys.stderr.getvalue()
+        finally:
+          sys.stderr = stderr
+      with open(src, 'wb') as fp:
+        fp.write(b'{"a": "on"}\n\n[1, 2]\n{"a": \n')
+      for jobs in ('1', '2'):
+        self.assertEqual(
+          _fail('tobool', 'a', '-j', jobs, '-b', '2'),
+          'morph: error: %s:3: cannot convert keys of non-dict record:'
+          ' [1, 2]\n' % (src,))
+        self.assertIn(
+          '%s:4: ' % (src,), _fail('flatten', '-j', jobs, '-b', '2'))
+      self.assertIn(
+        'morph: error: ',
+        _fail('flatten', '-o', os.path.join(tmpdir, 'nonexist', 'out')))
+      stderr = sys.stderr
+      sys.stderr = io.StringIO() if morph.PY3 else io.BytesIO()
+      try:
+        with self.assertRaises(SystemExit) as cm:
+          morph.cli.main(['pick', 'a', '--tree', '--prefix', 'x', '-i', src])
+        self.assertEqual(cm.exception.code, 2)
+        self.assertIn(
+          '--prefix and --tree cannot be used together', sys.stderr.getvalue())
+      finally:
+        sys.stderr = stderr
+    finally:
+      shutil.rmtree(tmpdir)
+
+
 #------------------------------------------------------------------------------
 # end of $Id$
 #------------------------------------------------------------------------------
@@ -69,6 +69,11 @@ setup(
   install_requires      = dependencies,
   tests_require         = test_dependencies,
   test_suite            = 'morph',
+  entry_points          = {
+    'console_scripts': [
+      'morph                = morph.cli:main',
+    ],
+  },
   license               = 'GPLv3+',
 )
 